@@ -1,4 +1,5 @@
 import re
+import shutil
 import tempfile
 from collections.abc import Callable
 from logging import error as log_error
@@ -15,9 +16,10 @@ from pypdf import PdfReader
 
 
 def _temp_file_wrapper(file: BinaryIO, loader: Callable, sep: str = '\n') -> str:
-	raw_bytes = file.read()
 	tmp = tempfile.NamedTemporaryFile(mode='wb')
-	tmp.write(raw_bytes)
+	# stream in chunks so the raw bytes never sit in memory alongside the decoded text
+	shutil.copyfileobj(file, tmp, length=64 * 1024)
+	tmp.flush()
 
 	docs = loader(tmp.name)
 
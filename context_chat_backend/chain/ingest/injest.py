@@ -1,24 +1,110 @@
-import re
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from logging import error as log_error
+from operator import methodcaller
+from os import cpu_count
+from typing import Any
+
+try:
+	# linear-time regex engine, falls back to the backtracking stdlib engine
+	import re2 as re
+except ImportError:
+	import re
 
 from fastapi.datastructures import UploadFile
 from langchain.schema import Document
 
-from ...utils import to_int
 from ...vectordb import BaseVectorDB
+from ...vectordb.base import TSearchDict
 from .doc_loader import decode_source
 from .doc_splitter import get_splitter_for
 from .mimetype_list import SUPPORTED_MIMETYPES
 
+# NOTE: re.VERBOSE is not used here, so this pattern compiles identically on both engines
+_RE_NEWLINES = re.compile(r'((\r)?\n){3,}')
+
+# every ascii char matched by \s, the non-ascii ones go through str.isspace
+_WS_CHARS = frozenset(' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f')
+
+
+def _collapse_ws(text: str) -> str:
+	'''
+	Collapses runs of 5 or more whitespace characters to the last character
+	of the run, like `re.sub(r'(\\s){5,}', r'\\g<1>', text)` but in a single
+	scan without the regex machinery.
+	'''
+	out = []
+	seg_start = 0  # start of the pending verbatim segment
+	run_start = -1  # start of the current whitespace run
+	for i, char in enumerate(text):
+		if char in _WS_CHARS or (not char.isascii() and char.isspace()):
+			if run_start < 0:
+				run_start = i
+		else:
+			if run_start >= 0 and i - run_start >= 5:
+				out.append(text[seg_start:run_start])
+				out.append(text[i - 1])
+				seg_start = i
+			run_start = -1
+
+	if run_start >= 0 and len(text) - run_start >= 5:
+		out.append(text[seg_start:run_start])
+		out.append(text[-1])
+		seg_start = len(text)
+
+	if seg_start == 0:
+		return text
+
+	out.append(text[seg_start:])
+	return ''.join(out)
+
 
 def _allowed_file(file: UploadFile) -> bool:
 	return file.headers.get('type', default='') in SUPPORTED_MIMETYPES
 
 
+def _eligible_source(source: UploadFile) -> bool:
+	'''
+	Cheap header checks to skip sources that would be dropped anyway,
+	before the expensive decode step.
+	'''
+	if source.headers.get('userId') is None:
+		log_error(f'userId not found in headers for source: {source.filename}')
+		return False
+
+	if source.size == 0:
+		return False
+
+	# either not a file or a file that is allowed
+	return (source.filename is not None and not source.filename.startswith('file: ')) \
+		or _allowed_file(source)
+
+
+def _to_ts(value: str | None) -> int:
+	# the `modified` header is always None or a decimal string of seconds,
+	# this skips the exception machinery of the generic utils.to_int
+	return int(value) if value and value.isdigit() else 0
+
+
+def _input_sources(documents: list[Document]) -> dict[str, Any]:
+	'''
+	Returns a map of source to modified time for the given documents.
+	'''
+	input_sources = {}
+	for meta in documents:
+		if meta.metadata.get('source') is None:
+			continue
+		input_sources[meta.metadata.get('source')] = meta.metadata.get('modified')
+
+	return input_sources
+
+
 def _filter_documents(
 	user_id: str,
 	vectordb: BaseVectorDB,
-	documents: list[Document]
+	documents: list[Document],
+	existing_objects: TSearchDict
 ) -> list[Document]:
 	'''
 	Returns a filtered list of documents that are not already in the vectordb
@@ -27,33 +113,26 @@ def _filter_documents(
 	'''
 	to_delete = {}
 
-	input_sources = {}
-	for meta in documents:
-		if meta.metadata.get('source') is None:
-			continue
-		input_sources[meta.metadata.get('source')] = meta.metadata.get('modified')
+	input_sources = _input_sources(documents)
 
-	existing_objects = vectordb.get_objects_from_metadata(
-		user_id,
-		'source',
-		list(input_sources.keys())
-	)
 	for source, existing_meta in existing_objects.items():
 		# recently modified files are re-embedded
-		if to_int(input_sources.get(source)) > to_int(existing_meta.get('modified')):
+		if _to_ts(input_sources.get(source)) > _to_ts(existing_meta.get('modified')):
 			to_delete[source] = existing_meta.get('id')
 
 	# delete old sources
-	vectordb.delete_by_ids(user_id, list(to_delete.values()))
+	if to_delete:
+		vectordb.delete_by_ids(user_id, list(to_delete.values()))
 
 	# sources not already in the vectordb + the ones that were deleted
-	new_sources = set(input_sources.keys()) \
-		.difference(set(existing_objects))
-	new_sources.update(set(to_delete.keys()))
+	# (dict keys views support set operations without intermediate sets)
+	new_sources = input_sources.keys() - existing_objects.keys() | to_delete.keys()
 
+	# hoists the bound method lookup out of the comprehension
+	_get_source = methodcaller('get', 'source')
 	return [
 		doc for doc in documents
-		if doc.metadata.get('source') in new_sources
+		if _get_source(doc.metadata) in new_sources
 	]
 
 
@@ -61,19 +140,26 @@ def _sources_to_documents(sources: list[UploadFile]) -> dict[str, list[Document]
 	'''
 	Converts a list of sources to a dictionary of documents with the user_id as the key.
 	'''
-	documents = {}
+	documents = defaultdict(list)
 
-	for source in sources:
-		user_id = source.headers.get('userId')
-		if user_id is None:
-			log_error(f'userId not found in headers for source: {source.filename}')
-			continue
+	# filter on the headers alone before decoding anything
+	sources = [source for source in sources if _eligible_source(source)]
+
+	# transform the sources to have text data
+	# NOTE: UploadFile objects are not picklable, so threads instead of processes,
+	# the underlying parsers mostly run in C extensions or do IO
+	if len(sources) > 1:
+		with ThreadPoolExecutor(max_workers=min(len(sources), cpu_count() or 1)) as executor:
+			contents = list(executor.map(decode_source, sources))
+	else:
+		contents = [decode_source(source) for source in sources]
 
-		# transform the source to have text data
-		content = decode_source(source)
+	for source, content in zip(sources, contents, strict=True):
 		if content is None or content == '':
 			continue
 
+		user_id = source.headers.get('userId')
+
 		metadata = {
 			'source': source.filename,
 			'title': source.headers.get('title'),
@@ -82,86 +168,149 @@ def _sources_to_documents(sources: list[UploadFile]) -> dict[str, list[Document]
 			'provider': source.headers.get('provider'),
 		}
 
-		document = Document(page_content=content, metadata=metadata)
-
-		if documents.get(user_id) is not None:
-			documents[user_id].append(document)
-		else:
-			documents[user_id] = [document]
+		documents[user_id].append(Document(page_content=content, metadata=metadata))
 
 	return documents
 
 
 def _bucket_by_type(documents: list[Document]) -> dict[str, list[Document]]:
-	bucketed_documents = {}
+	bucketed_documents = defaultdict(list)
 
 	for doc in documents:
-		doc_type = doc.metadata.get('type')
-
-		if bucketed_documents.get(doc_type) is not None:
-			bucketed_documents[doc_type].append(doc)
-		else:
-			bucketed_documents[doc_type] = [doc]
+		bucketed_documents[doc.metadata.get('type')].append(doc)
 
 	return bucketed_documents
 
 
-def _process_sources(vectordb: BaseVectorDB, sources: list[UploadFile]) -> bool:
-	ddocuments: dict[str, list[Document]] = _sources_to_documents(sources)
+def _prepare_user_documents(
+	vectordb: BaseVectorDB,
+	user_id: str,
+	documents: list[Document],
+	existing_objects: TSearchDict
+) -> list[Document]:
+	'''
+	Filters, splits and cleans the documents of one user,
+	returning the list of chunks ready for embedding.
+	'''
+	split_documents: list[Document] = []
+	filtered_docs = _filter_documents(user_id, vectordb, documents, existing_objects)
 
-	if len(ddocuments.keys()) == 0:
-		# document(s) were empty, not an error
-		return True
+	if len(filtered_docs) == 0:
+		return []
 
-	success = True
+	type_bucketed_docs = _bucket_by_type(filtered_docs)
 
-	for user_id, documents in ddocuments.items():
-		split_documents: list[Document] = []
-		filtered_docs = _filter_documents(user_id, vectordb, documents)
+	for _type, _docs in type_bucketed_docs.items():
+		text_splitter = get_splitter_for(_type)
+		split_docs = text_splitter.split_documents(_docs)
+		split_documents.extend(split_docs)
 
-		if len(filtered_docs) == 0:
-			continue
+	# replace more than two newlines with two newlines (also blank spaces, more than 4)
+	for doc in split_documents:
+		doc.page_content = _RE_NEWLINES.sub('\n\n', doc.page_content)
+		# NOTE: do not use this with all docs when programming files are added
+		doc.page_content = _collapse_ws(doc.page_content)
+
+	# filter out empty documents
+	return list(filter(lambda doc: doc.page_content != '', split_documents))
 
-		type_bucketed_docs = _bucket_by_type(filtered_docs)
 
-		for _type, _docs in type_bucketed_docs.items():
-			text_splitter = get_splitter_for(_type)
-			split_docs = text_splitter.split_documents(_docs)
-			split_documents.extend(split_docs)
+def _add_via_user_client(
+	vectordb: BaseVectorDB,
+	user_id: str,
+	split_documents: list[Document]
+) -> bool:
+	user_client = vectordb.get_user_client(user_id)
+	if user_client is None:
+		log_error('Error: Weaviate client not initialised')
+		return False
 
-		# replace more than two newlines with two newlines (also blank spaces, more than 4)
-		for doc in split_documents:
-			doc.page_content = re.sub(r'((\r)?\n){3,}', '\n\n', doc.page_content)
-			# NOTE: do not use this with all docs when programming files are added
-			doc.page_content = re.sub(r'(\s){5,}', r'\g<1>', doc.page_content)
+	doc_ids = user_client.add_documents(split_documents)
+
+	# does not do per document error checking
+	return len(split_documents) == len(doc_ids)
 
-		# filter out empty documents
-		split_documents = list(filter(lambda doc: doc.page_content != '', split_documents))
-		if len(split_documents) == 0:
-			continue
 
-		user_client = vectordb.get_user_client(user_id)
-		if user_client is None:
-			log_error('Error: Weaviate client not initialised')
-			return False
+async def _process_sources(vectordb: BaseVectorDB, sources: list[UploadFile]) -> bool:
+	# decoding blocks on its worker threads, keep it off the event loop
+	ddocuments: dict[str, list[Document]] = await asyncio.to_thread(_sources_to_documents, sources)
 
-		doc_ids = user_client.add_documents(split_documents)
+	if len(ddocuments) == 0:
+		# document(s) were empty, not an error
+		return True
+
+	# one metadata round-trip for all users instead of one per user
+	dexisting_objects = await asyncio.to_thread(
+		vectordb.get_objects_from_metadata_for_users,
+		{ user_id: list(_input_sources(documents)) for user_id, documents in ddocuments.items() },
+		'source',
+	)
+
+	# filter, split and clean per user in parallel, the vectordb round-trips
+	# are independent between users
+	split_lists = await asyncio.gather(*[
+		asyncio.to_thread(_prepare_user_documents, vectordb, user_id, documents, dexisting_objects.get(user_id, {}))
+		for user_id, documents in ddocuments.items()
+	])
+	dsplit_documents = {
+		user_id: split_documents
+		for user_id, split_documents in zip(ddocuments, split_lists, strict=True)
+		if len(split_documents) > 0
+	}
+
+	if len(dsplit_documents) == 0:
+		# all documents were filtered out, not an error
+		return True
+
+	if vectordb.embedding is not None:
+		# one embedding round-trip for the whole batch instead of one per user
+		all_documents = [doc for docs in dsplit_documents.values() for doc in docs]
+		texts = [doc.page_content for doc in all_documents]
+
+		# embed in ascending length order so each micro-batch pads to similar
+		# sizes, then restore the original order for the scatter below
+		order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+		# embedding inference dominates ingest wall time, keep it off the event loop
+		sorted_embeddings = await asyncio.to_thread(
+			vectordb.embedding.embed_documents, [texts[i] for i in order]
+		)
+
+		embeddings: list[list[float]] = [[]] * len(texts)
+		for pos, i in enumerate(order):
+			embeddings[i] = sorted_embeddings[pos]
+
+		dembeddings = {}
+		offset = 0
+		for user_id, split_documents in dsplit_documents.items():
+			dembeddings[user_id] = embeddings[offset:offset + len(split_documents)]
+			offset += len(split_documents)
+
+		doc_id_lists = await asyncio.gather(*[
+			asyncio.to_thread(
+				vectordb.add_documents_with_embeddings, user_id, split_documents, dembeddings[user_id]
+			)
+			for user_id, split_documents in dsplit_documents.items()
+		])
 
 		# does not do per document error checking
-		success &= len(split_documents) == len(doc_ids)
+		return all(
+			len(split_documents) == len(doc_ids)
+			for split_documents, doc_ids in zip(dsplit_documents.values(), doc_id_lists, strict=True)
+		)
+
+	# sequential on purpose: langchain's weaviate wrapper funnels every
+	# add_documents through the shared, non-thread-safe client batch
+	success = True
+	for user_id, split_documents in dsplit_documents.items():
+		success &= await asyncio.to_thread(_add_via_user_client, vectordb, user_id, split_documents)
 
 	return success
 
 
-def embed_sources(
+async def embed_sources(
 	vectordb: BaseVectorDB,
 	sources: list[UploadFile],
 ) -> bool:
-	# either not a file or a file that is allowed
-	sources_filtered = [
-		source for source in sources
-		if (source.filename is not None and not source.filename.startswith('file: '))
-		or _allowed_file(source)
-	]
-
-	return _process_sources(vectordb, sources_filtered)
+	# sources are filtered in _sources_to_documents in the same pass
+	# that checks the other headers
+	return await _process_sources(vectordb, sources)
@@ -175,7 +175,7 @@ def _(providerKey: str = Body(embed=True)):
 
 @app.put('/loadSources')
 @enabled_guard(app)
-def _(sources: list[UploadFile]):
+async def _(sources: list[UploadFile]):
 	if len(sources) == 0:
 		return JSONResponse('No sources provided', 400)
 
@@ -193,7 +193,7 @@ def _(sources: list[UploadFile]):
 	if db is None:
 		return JSONResponse('Error: VectorDB not initialised', 500)
 
-	result = embed_sources(db, sources)
+	result = await embed_sources(db, sources)
 	if not result:
 		return JSONResponse('Error: All sources were not loaded, check logs for more info', 500)
 
@@ -1,11 +1,12 @@
 import os
-import re
-import shutil
 import tarfile
 import zipfile
-from hashlib import file_digest
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from hashlib import file_digest, sha256
 from logging import error as log_error
 from pathlib import Path
+from typing import BinaryIO
 
 import requests
 from dotenv import load_dotenv
@@ -14,6 +15,12 @@ from fastapi import FastAPI
 from .config_parser import TConfig
 from .utils import update_progress
 
+try:
+	# SIMD-accelerated inflate, noticeably faster than stdlib zlib on model archives
+	from isal import igzip
+except ImportError:
+	igzip = None
+
 load_dotenv()
 
 _MODELS_DIR = ''
@@ -43,6 +50,41 @@ _KNOWN_ARCHIVES = (
 	'.tar.xz',
 	'.zip',
 )
+_KNOWN_EXT_SET = frozenset(_KNOWN_EXTENSIONS)
+_KNOWN_ARCHIVE_SET = frozenset(_KNOWN_ARCHIVES)
+
+def _open_tar_gz(filepath: str) -> tuple[tarfile.TarFile, BinaryIO | None]:
+	if igzip is None:
+		return tarfile.open(filepath, 'r:gz'), None
+
+	# returned alongside since tarfile does not close externally provided fileobjs
+	fileobj = igzip.IGzipFile(filepath, 'rb')
+	return tarfile.open(fileobj=fileobj, mode='r|'), fileobj
+
+
+# faster decompressors can be plugged in here per extension
+_ARCHIVE_OPENERS: dict[str, Callable[[str], tuple[tarfile.TarFile | zipfile.ZipFile, BinaryIO | None]]] = {
+	'.tar.gz': _open_tar_gz,
+	'.tar.bz2': lambda filepath: (tarfile.open(filepath, 'r:bz2'), None),
+	'.tar.xz': lambda filepath: (tarfile.open(filepath, 'r:xz'), None),
+	'.zip': lambda filepath: (zipfile.ZipFile(filepath, 'r'), None),
+}
+
+
+def _has_known_extension(filename: str) -> bool:
+	# hash the one and two component suffixes instead of scanning the tuple
+	parts = filename.rsplit('.', 2)
+	return len(parts) >= 2 \
+		and (parts[-1] in _KNOWN_EXT_SET or f'{parts[-2]}.{parts[-1]}' in _KNOWN_EXT_SET)
+
+
+def _archive_extension(filepath: str) -> str | None:
+	parts = filepath.rsplit('.', 2)
+	if len(parts) == 3 and (extension := f'.{parts[-2]}.{parts[-1]}') in _KNOWN_ARCHIVE_SET:
+		return extension
+	if len(parts) >= 2 and (extension := f'.{parts[-1]}') in _KNOWN_ARCHIVE_SET:
+		return extension
+	return None
 
 _model_config: dict[str, tuple[str, str, str]] = {
 	'hkunlp/instructor-base': ('hkunlp_instructor-base', '.tar.gz', '19751ec112564f2c568b96a794dd4a16f335ee42b2535a890b577fc5137531eb'),  # noqa: E501
@@ -50,17 +92,29 @@ _model_config: dict[str, tuple[str, str, str]] = {
 }
 
 
+# the config does not change within a process, so both lookups below are cacheable,
+# a model file existing is also monotonic within the process lifetime
+_model_names: dict[str, str | None] = {}
+_existing_models: set[str] = set()
+
+
 def _get_model_name_or_path(config: TConfig, model_type: str) -> str | None:
+	if model_type in _model_names:
+		return _model_names[model_type]
+
+	model_name = None
 	if (model_config := config.get(model_type)) is not None:
 		model_config = model_config[1]
-		return (
+		model_name = (
 			model_config.get('model_name')
 			or model_config.get('model_path')
 			or model_config.get('model_id')
 			or model_config.get('model_file')
 			or model_config.get('model')
 		)
-	return None
+
+	_model_names[model_type] = model_name
+	return model_name
 
 
 def _set_app_config(app: FastAPI, config: TConfig):
@@ -104,15 +158,85 @@ def _set_app_config(app: FastAPI, config: TConfig):
 		app.extra['LLM_MODEL'] = model
 
 
+def _write_hash_sidecar(filepath: str, digest: str) -> None:
+	'''
+	Records the verified digest along with the file's size and mtime so later
+	startups can trust the file without re-hashing gigabytes.
+	'''
+	stat = os.stat(filepath)
+	Path(filepath + '.sha256').write_text(f'{digest} {stat.st_size} {int(stat.st_mtime)}\n')
+
+
+def _check_hash_sidecar(filepath: str) -> bool | None:
+	'''
+	Returns None when no sidecar exists, True when the recorded size and mtime
+	still match the file, False otherwise.
+	'''
+	sidecar = Path(filepath + '.sha256')
+	if not sidecar.exists():
+		return None
+
+	try:
+		_digest, size, mtime = sidecar.read_text().split()
+		stat = os.stat(filepath)
+		return int(size) == stat.st_size and int(mtime) == int(stat.st_mtime)
+	except (OSError, ValueError):
+		return False
+
+
+def _hash_file(filepath: str) -> str:
+	with open(filepath, 'rb') as f:
+		return file_digest(f, 'sha256').hexdigest()
+
+
+def _file_intact(filepath: str, expected_digest: str | None) -> bool:
+	if not os.path.exists(filepath):
+		return False
+
+	sidecar_state = _check_hash_sidecar(filepath)
+
+	if sidecar_state is False:
+		# the file changed after it was verified, remove it so it is fetched again
+		log_error(f'Error: Model file ({filepath}) does not match its recorded hash, downloading again')
+		os.remove(filepath)
+		Path(filepath + '.sha256').unlink(missing_ok=True)
+		return False
+
+	if sidecar_state is None and expected_digest is not None and os.path.isfile(filepath):
+		# no sidecar means the file was never verified (e.g. left behind by an
+		# older version or an interrupted run), hash it this once
+		digest = _hash_file(filepath)
+		if digest != expected_digest:
+			log_error(f'Error: Model file ({filepath}) does not match its declared hash, downloading again')
+			os.remove(filepath)
+			return False
+
+		_write_hash_sidecar(filepath, digest)
+
+	return True
+
+
 def _model_exists(model_name_or_path: str) -> bool:
-	if os.path.exists(model_name_or_path):
+	if model_name_or_path in _existing_models:
+		return True
+
+	if model_name_or_path.startswith('/'):
+		model_name = os.path.basename(model_name_or_path)
+	else:
+		model_name = model_name_or_path.rpartition(_MODELS_DIR + '/')[2]
+	expected_digest = _model_config.get(model_name, (None, None, None))[2]
+
+	if _file_intact(model_name_or_path, expected_digest):
+		_existing_models.add(model_name_or_path)
 		return True
 
-	if os.path.exists(Path(_MODELS_DIR, model_name_or_path)):
+	if _file_intact(Path(_MODELS_DIR, model_name_or_path).as_posix(), expected_digest):
+		_existing_models.add(model_name_or_path)
 		return True
 
 	if (extracted_name := _model_config.get(model_name_or_path)) is not None \
 		and os.path.exists(Path(_MODELS_DIR, extracted_name[0])):
+		_existing_models.add(model_name_or_path)
 		return True
 
 	return False
@@ -129,13 +253,13 @@ def _download_model(model_name_or_path: str) -> bool:
 	if model_name_or_path.startswith('/'):
 		model_name = os.path.basename(model_name_or_path)
 	else:
-		model_name = re.sub(r'^.*' + _MODELS_DIR + r'/', '', model_name_or_path)
+		model_name = model_name_or_path.rpartition(_MODELS_DIR + '/')[2]
 
 	if model_name in _model_config:
 		model_file = _model_config[model_name][0] + _model_config[model_name][1]
 		url = _BASE_URL + model_file
 		filepath = Path(_MODELS_DIR, model_file).as_posix()
-	elif model_name.endswith(_KNOWN_EXTENSIONS):
+	elif _has_known_extension(model_name):
 		url = _BASE_URL + model_name
 		filepath = Path(_MODELS_DIR, model_name).as_posix()
 	else:
@@ -151,26 +275,47 @@ def _download_model(model_name_or_path: str) -> bool:
 			log_error(f"Error: Network error while downloading '{url}': {r}")
 			return False
 
-		shutil.copyfileobj(r.raw, f, length=16 * 1024 * 1024)  # 16MB chunks
-
 		# hash check if the config is declared
+		original_digest = None
 		if model_name in _model_config:
-			f.seek(0)
 			original_digest = _model_config.get(model_name, (None, None, None))[2]
 			if original_digest is None:
 				# warning
 				log_error(f'Error: Hash not found for model {model_name}, continuing without hash check')
-			else:
-				digest = file_digest(f, 'sha256').hexdigest()
-				if (original_digest != digest):
-					log_error(
-						f'Error: Model file ({filepath}) corrupted:\nexpected hash {original_digest}\ngot {digest}'
-					)
-					return False
+
+		# hash while streaming to avoid a second read of the downloaded file
+		# NOTE: readinto reuses one buffer instead of allocating a fresh bytes
+		# object per chunk (socket -> file sendfile is not an option here, the
+		# body may need content decompression and hashing in userspace)
+		hasher = sha256() if original_digest is not None else None
+		buf = memoryview(bytearray(16 * 1024 * 1024))  # 16MB chunks
+		while (length := r.raw.readinto(buf)) != 0:
+			f.write(buf[:length])
+			if hasher is not None:
+				hasher.update(buf[:length])
+
+		if hasher is not None:
+			digest = hasher.hexdigest()
+			if (original_digest != digest):
+				log_error(
+					f'Error: Model file ({filepath}) corrupted:\nexpected hash {original_digest}\ngot {digest}'
+				)
+				# do not leave the corrupt file around to be trusted on restart
+				f.close()
+				os.remove(filepath)
+				return False
 
 		f.close()
 
-		return _extract_n_save(model_name, filepath)
+		if not _extract_n_save(model_name, filepath):
+			return False
+
+		if hasher is not None and _archive_extension(filepath) is None:
+			# the verified file was moved into _MODELS_DIR, record its digest
+			final_path = Path(_MODELS_DIR, model_name.rpartition(_MODELS_DIR + '/')[2]).as_posix()
+			_write_hash_sidecar(final_path, digest)
+
+		return True
 	except OSError as e:
 		log_error(e)
 		return False
@@ -181,26 +326,18 @@ def _extract_n_save(model_name: str, filepath: str) -> bool:
 		raise OSError('Error: Model file not found after successful download. This should not happen.')
 
 	# extract the model if it is a compressed file
-	if (filepath.endswith(_KNOWN_ARCHIVES)):
-		tar_archive = None
-		zip_archive = None
-
+	if (archive_extension := _archive_extension(filepath)) is not None:
 		try:
-			if filepath.endswith('.tar.gz'):
-				tar_archive = tarfile.open(filepath, 'r:gz')
-			elif filepath.endswith('.tar.bz2'):
-				tar_archive = tarfile.open(filepath, 'r:bz2')
-			elif filepath.endswith('.tar.xz'):
-				tar_archive = tarfile.open(filepath, 'r:xz')
-			elif filepath.endswith('.zip'):
-				zip_archive = zipfile.ZipFile(filepath, 'r')
-
-			if tar_archive:
-				tar_archive.extractall(_MODELS_DIR, filter='data')
-				tar_archive.close()
-			elif zip_archive:
-				zip_archive.extractall(_MODELS_DIR)  # noqa: S202
-				zip_archive.close()
+			archive, ext_fileobj = _ARCHIVE_OPENERS[archive_extension](filepath)
+			try:
+				if isinstance(archive, tarfile.TarFile):
+					archive.extractall(_MODELS_DIR, filter='data')
+				else:
+					archive.extractall(_MODELS_DIR)  # noqa: S202
+			finally:
+				archive.close()
+				if ext_fileobj is not None:
+					ext_fileobj.close()
 
 			os.remove(filepath)
 		except OSError as e:
@@ -208,7 +345,7 @@ def _extract_n_save(model_name: str, filepath: str) -> bool:
 
 		return True
 
-	model_name = re.sub(r'^.*' + _MODELS_DIR + r'/', '', model_name)
+	model_name = model_name.rpartition(_MODELS_DIR + '/')[2]
 	try:
 		os.rename(filepath, Path(_MODELS_DIR, model_name).as_posix())
 		return True
@@ -230,16 +367,26 @@ def download_all_models(app: FastAPI):
 	if os.getenv('DISABLE_CUSTOM_DOWNLOAD_URI', '0') == '1':
 		update_progress(100)
 
-	progress = 0
+	model_names = []
 	for model_type in ('embedding', 'llm'):
 		model_name = _get_model_name_or_path(config, model_type)
 		if model_name is None:
 			raise Exception(f'Error: Model name/path not found for {model_type}')
 
-		if not _download_model(model_name):
-			raise Exception(f'Error: Model download failed for {model_name}')
+		model_names.append(model_name)
 
-		update_progress(progress := progress + 50)
+	# the two downloads are independent, overlap them
+	progress = 0
+	with ThreadPoolExecutor(max_workers=2) as executor:
+		futures = {
+			executor.submit(_download_model, model_name): model_name
+			for model_name in model_names
+		}
+		for future in as_completed(futures):
+			if not future.result():
+				raise Exception(f'Error: Model download failed for {futures[future]}')
+
+			update_progress(progress := progress + 50)
 
 	_set_app_config(app, config)
 
@@ -1,5 +1,6 @@
 from collections.abc import Callable
 from functools import wraps
+from inspect import iscoroutinefunction
 from os import getenv
 from typing import Any, TypeVar
 
@@ -70,6 +71,17 @@ def enabled_guard(app: FastAPI):
 
 			return func(*args, **kwargs)
 
+		# a sync wrapper would hide the coroutine from FastAPI
+		if iscoroutinefunction(func):
+			@wraps(func)
+			async def async_wrapper(*args, **kwargs):
+				if getenv('DISABLE_AAA', '0') == '0' and not app.extra.get('ENABLED', False):
+					return JSONResponse('Context Chat is disabled, enable it from AppAPI to use it.', 503)
+
+				return await func(*args, **kwargs)
+
+			return async_wrapper
+
 		return wrapper
 
 	return decorator
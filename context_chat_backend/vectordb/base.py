@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from typing import Any, TypedDict
 
+from langchain.schema import Document
 from langchain.schema.embeddings import Embeddings
 from langchain.vectorstores import VectorStore
 
@@ -116,6 +117,58 @@ class BaseVectorDB(ABC):
 		TSearchDict
 		'''
 
+	def get_objects_from_metadata_for_users(
+		self,
+		duser_values: dict[str, list[str]],
+		metadata_key: str,
+	) -> dict[str, TSearchDict]:
+		'''
+		Get all objects with the given metadata key and values for several users at once.
+		(Only gets the following fields: [id, 'metadata_key', modified])
+
+		Args
+		----
+		duser_values: dict[str, list[str]]
+			Map of user ID to the metadata values to get.
+		metadata_key: str
+			Metadata key to get.
+
+		Returns
+		-------
+		dict[str, TSearchDict]
+			Map of user ID to the matching objects.
+		'''
+		return {
+			user_id: self.get_objects_from_metadata(user_id, metadata_key, values)
+			for user_id, values in duser_values.items()
+		}
+
+	@abstractmethod
+	def add_documents_with_embeddings(
+		self,
+		user_id: str,
+		documents: list[Document],
+		embeddings: list[list[float]],
+	) -> list[str]:
+		'''
+		Adds documents with precomputed embeddings to the given user's database,
+		skipping the embedding step of the user client.
+
+		Args
+		----
+		user_id: str
+			User ID to whose database to add the documents.
+		documents: list[Document]
+			List of documents to add.
+		embeddings: list[list[float]]
+			Embedding vectors, one per document.
+
+		Returns
+		-------
+		list[str]
+			List of ids of the added documents.
+		'''
+
 	def delete_by_ids(self, user_id: str, ids: list[str]) -> bool:
 		'''
 		Deletes all documents with the given ids for the given user.
@@ -1,9 +1,11 @@
 from logging import error as log_error
 from os import getenv
+from uuid import uuid4
 
 from chromadb import Client
 from chromadb.config import Settings
 from dotenv import load_dotenv
+from langchain.schema import Document
 from langchain.schema.embeddings import Embeddings
 from langchain.vectorstores import Chroma, VectorStore
 
@@ -65,6 +67,27 @@ class VectorDB(BaseVectorDB):
 			embedding_function=em,
 		)
 
+	def add_documents_with_embeddings(
+		self,
+		user_id: str,
+		documents: list[Document],
+		embeddings: list[list[float]],
+	) -> list[str]:
+		if not self.client:
+			raise Exception('Error: Chromadb client not initialised')
+
+		self.setup_schema(user_id)
+
+		ids = [str(uuid4()) for _ in documents]
+		self.client.get_collection(COLLECTION_NAME(user_id)).upsert(
+			ids=ids,
+			embeddings=embeddings,
+			metadatas=[document.metadata for document in documents],
+			documents=[document.page_content for document in documents],
+		)
+
+		return ids
+
 	def get_metadata_filter(self, filters: list[MetadataFilter]) -> dict | None:
 		if len(filters) == 0:
 			return None
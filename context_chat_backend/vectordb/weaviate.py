@@ -1,7 +1,9 @@
 from logging import error as log_error
 from os import getenv
+from threading import Lock
 
 from dotenv import load_dotenv
+from langchain.schema import Document
 from langchain.schema.embeddings import Embeddings
 from langchain.vectorstores import VectorStore, Weaviate
 from weaviate import AuthApiKey, Client
@@ -88,6 +90,8 @@ class VectorDB(BaseVectorDB):
 
 		self.client = client
 		self.embedding = embedding
+		# client.batch is shared stateful v3 api, its context manager is not thread-safe
+		self._batch_lock = Lock()
 
 	def get_users(self) -> list[str]:
 		if not self.client:
@@ -134,6 +138,28 @@ class VectorDB(BaseVectorDB):
 
 		return weaviate_obj
 
+	def add_documents_with_embeddings(
+		self,
+		user_id: str,
+		documents: list[Document],
+		embeddings: list[list[float]],
+	) -> list[str]:
+		if not self.client:
+			raise Exception('Error: Weaviate client not initialised')
+
+		self.setup_schema(user_id)
+
+		ids = []
+		with self._batch_lock, self.client.batch as batch:
+			for document, embedding in zip(documents, embeddings, strict=True):
+				ids.append(batch.add_data_object(
+					data_object={ 'text': document.page_content, **document.metadata },
+					class_name=COLLECTION_NAME(user_id),
+					vector=embedding,
+				))
+
+		return ids
+
 	def get_metadata_filter(self, filters: list[MetadataFilter]) -> dict | None:
 		if len(filters) == 0:
 			return None
@@ -211,3 +237,68 @@ class VectorDB(BaseVectorDB):
 		except Exception as e:
 			log_error(f'Error: Weaviate query error: {e}')
 			return {}
+
+	def get_objects_from_metadata_for_users(
+		self,
+		duser_values: dict[str, list[str]],
+		metadata_key: str,
+	) -> dict[str, TSearchDict]:
+		# NOTE: the limit of objects returned is not known, maybe it would be better to set one manually
+
+		if not self.client:
+			raise Exception('Error: Weaviate client not initialised')
+
+		output: dict[str, TSearchDict] = { user_id: {} for user_id in duser_values }
+
+		user_ids = [user_id for user_id, values in duser_values.items() if len(values) > 0]
+		if len(user_ids) == 0:
+			return output
+
+		queries = []
+		for user_id in user_ids:
+			self.setup_schema(user_id)
+
+			data_filter = self.get_metadata_filter([{
+				'metadata_key': metadata_key,
+				'values': duser_values[user_id],
+			}])
+			if data_filter is None:
+				continue
+
+			queries.append(
+				self.client.query
+					.get(COLLECTION_NAME(user_id), [metadata_key, 'modified'])
+					.with_additional('id')
+					.with_where(data_filter)
+			)
+
+		if len(queries) == 0:
+			return output
+
+		# one aggregated GraphQL query instead of one round-trip per user
+		results = self.client.query.multi_get(queries)
+
+		if results.get('errors') is not None:
+			log_error(f'Error: Weaviate query error: {results.get("errors")}')
+			return output
+
+		for user_id in user_ids:
+			dmeta = {}
+			for val in duser_values[user_id]:
+				dmeta[val] = True
+
+			try:
+				user_results = results['data']['Get'][COLLECTION_NAME(user_id)]
+				for result in user_results:
+					# case sensitive matching
+					if dmeta.get(result[metadata_key]) is None:
+						continue
+
+					output[user_id][result[metadata_key]] = {
+						'id': result['_additional']['id'],
+						'modified': result['modified'],
+					}
+			except Exception as e:
+				log_error(f'Error: Weaviate query error: {e}')
+
+		return output